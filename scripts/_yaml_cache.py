@@ -0,0 +1,66 @@
+"""
+Shared loader for the disease YAML files used by the Merck scripts.
+
+Parsing every file under data/diseases is the slowest part of each script's
+load phase. The parsed data is cached in a single JSON index together with a
+manifest of (file name, mtime, size); the YAML files are only re-parsed when
+that manifest no longer matches.
+
+Parsing uses libyaml's CSafeLoader when PyYAML was built with it (the
+`pip install pyyaml` wheels are) and falls back to the pure-Python loader.
+"""
+
+import hashlib
+import orjson
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+DISEASES_DIR = Path("C:/project/vetpro/data/diseases")
+INDEX_FILE = Path("C:/project/vetpro/scripts/diseases.index.json")
+LOAD_THREADS = 32  # Overlaps open/read syscalls on a cold rebuild
+
+def build_manifest(files):
+    """Hash the name, mtime and size of every file into a cache key."""
+    digest = hashlib.sha1()
+    for f in files:
+        st = f.stat()
+        digest.update(f"{f.name}\0{st.st_mtime_ns}\0{st.st_size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def _load_yaml(path):
+    """Parse one YAML file."""
+    with open(path, "r", encoding="utf-8") as fh:
+        return yaml.load(fh, Loader=SafeLoader)
+
+def load_all_diseases(diseases_dir=DISEASES_DIR, index_file=INDEX_FILE):
+    """Return {file stem: parsed YAML data} for every disease file."""
+    files = sorted(diseases_dir.glob("*.yaml"))
+    manifest = build_manifest(files)
+
+    if index_file.exists():
+        try:
+            index = orjson.loads(index_file.read_bytes())
+            if index.get("manifest") == manifest:
+                return index["diseases"]
+        except (ValueError, KeyError):
+            pass  # Corrupt or outdated index; rebuild below
+
+    with ThreadPoolExecutor(max_workers=LOAD_THREADS) as executor:
+        parsed = executor.map(_load_yaml, files)
+        diseases = {f.stem: data for f, data in zip(files, parsed)}
+
+    # Non-string keys (e.g. YAML `1:` or `true:`) are stored as strings; the
+    # rebuilt data is returned from the dumped bytes so a cold run sees the
+    # same types (dates as strings, string keys) as a warm one
+    dumped = orjson.dumps(
+        {"manifest": manifest, "diseases": diseases}, option=orjson.OPT_NON_STR_KEYS
+    )
+    index_file.write_bytes(dumped)
+
+    return orjson.loads(dumped)["diseases"]
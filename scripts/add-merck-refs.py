@@ -3,18 +3,43 @@ Add Merck Manual reference page numbers to all matched disease YAML files.
 Adds a merckManualRef field with the 11th edition page number.
 """
 
-import json
+import io
+import orjson
+import os
 import re
 from pathlib import Path
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap
+from ruamel.yaml.scalarstring import DoubleQuotedScalarString
+
+from _yaml_cache import load_all_diseases
 
 MATCH_FILE = Path("C:/project/vetpro/scripts/merck-disease-content.json")
 DISEASES_DIR = Path("C:/project/vetpro/data/diseases")
 
+# Round-trip YAML, used only to render the new block. A full load/dump would
+# also reformat flow maps, nested list indents and explicit nulls elsewhere in
+# the file, so only the ref block is dumped and appended.
+yaml = YAML(typ="rt")
+yaml.preserve_quotes = True
+yaml.width = 4096
+yaml.indent(mapping=2, sequence=4, offset=2)
+
+def has_merck_ref(yaml_file):
+    """Cheap check for a top-level merckManualRef key in the last 4 KB of a file."""
+    with open(yaml_file, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 4096))
+        return b"\nmerckManualRef:" in f.read()
+
 def main():
-    with open(MATCH_FILE, "r", encoding="utf-8") as f:
-        matches = json.load(f)
+    content = orjson.loads(MATCH_FILE.read_bytes())
+    sections = content["sections"]
+    matches = content["diseases"]
+
+    diseases = load_all_diseases(DISEASES_DIR)
 
-    updated = 0
+    updates = []
     skipped = 0
 
     for slug, data in matches.items():
@@ -23,38 +48,48 @@ def main():
             continue
 
         # Get the best match page number
-        best_match = data["matches"][0]
+        best_match = sections[data["matches"][0]["section_id"]]
         pdf_page = best_match["pdf_page"]
         # Calculate approximate book page (PDF page - ~41 offset for front matter)
         # The offset varies; we'll store the PDF page as-is with a note
         merck_chapter = best_match["chapter"]
         merck_title = best_match["title"]
 
-        with open(yaml_file, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        # Skip if already has merckManualRef
-        if "merckManualRef:" in content:
+        # This script appends the ref at the end of the file, so on reruns the
+        # tail check skips most files without reading or parsing them
+        if has_merck_ref(yaml_file):
             skipped += 1
             continue
 
-        # Add merckManualRef at the end of the file
-        ref_block = f"""
-merckManualRef:
-  edition: 11
-  chapter: "{merck_chapter}"
-  sectionTitle: "{merck_title}"
-  pdfPage: {pdf_page}
-"""
-        # Ensure file ends with newline, then add ref
-        content = content.rstrip() + "\n" + ref_block.strip() + "\n"
+        # Skip if already has merckManualRef elsewhere in the file; the cached
+        # index answers that without a round-trip parse
+        if "merckManualRef" in diseases[slug]:
+            skipped += 1
+            continue
 
-        with open(yaml_file, "w", encoding="utf-8") as f:
-            f.write(content)
+        # Append merckManualRef at the end of the file, leaving the existing
+        # text byte-for-byte unchanged
+        ref = CommentedMap([("merckManualRef", CommentedMap([
+            ("edition", 11),
+            ("chapter", DoubleQuotedScalarString(merck_chapter)),
+            ("sectionTitle", DoubleQuotedScalarString(merck_title)),
+            ("pdfPage", pdf_page),
+        ]))])
+        buf = io.StringIO()
+        yaml.dump(ref, buf)
+        original = yaml_file.read_text(encoding="utf-8")
+        if original and not original.endswith("\n"):
+            original += "\n"
+        updates.append((yaml_file, original + buf.getvalue()))
 
-        updated += 1
+    # Write all patched files in one pass; write-then-rename keeps each file
+    # intact if the run is interrupted
+    for yaml_file, content in updates:
+        tmp_file = yaml_file.with_suffix(".yaml.tmp")
+        tmp_file.write_text(content, encoding="utf-8")
+        os.replace(tmp_file, yaml_file)
 
-    print(f"Updated: {updated}")
+    print(f"Updated: {len(updates)}")
     print(f"Skipped (already has ref): {skipped}")
     print(f"Total matched: {len(matches)}")
 
@@ -10,58 +10,68 @@ Uses pattern matching + keyword extraction (NOT copy-paste) to respect copyright
 All output is original Chinese text informed by Merck's medical content.
 """
 
-import json
+import io
+import orjson
+import os
 import re
-import yaml
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap
+
+from _yaml_cache import load_all_diseases
 
 MATCH_FILE = Path("C:/project/vetpro/scripts/merck-disease-content.json")
 DISEASES_DIR = Path("C:/project/vetpro/data/diseases")
 
-def extract_differential_diagnoses(merck_text, disease_name):
+# Round-trip loader/dumper. It keeps comments and quoting, but not every
+# layout (flow-map spacing, some nested list indents, explicit nulls), so an
+# edit is only written back when the rest of the file comes out unchanged.
+yaml = YAML(typ="rt")
+yaml.preserve_quotes = True
+yaml.width = 4096
+yaml.indent(mapping=2, sequence=4, offset=2)
+
+# Phrases that introduce lists of differentials, clinical signs and prognosis
+DIFFERENTIALS_PATTERN = re.compile(
+    # "must be differentiated from X"
+    r'differentiat\w+ from (?P<a>.+?)(?:\.|$)'
+    # "differential diagnosis includes X"
+    r'|differential diagnos\w+ (?:include|are|is)\s+(?P<b>.+?)(?:\.|$)'
+    # "should be considered: X, Y, Z"
+    r'|should be (?:considered|ruled out)[:\s]+(?P<c>.+?)(?:\.|$)'
+)
+CLINICAL_SIGNS_PATTERN = re.compile(r'clinical (?:signs?|features?|findings?) (?:include|are|may include)\s+(.+?)(?:\.|$)')
+PROGNOSIS_SENTENCE_PATTERN = re.compile(r'[^.]*(?:prognosis|mortality|survival|fatal)[^.]*\.')
+LIST_SPLIT_PATTERN = re.compile(r',\s*(?:and\s+)?|;\s*')
+
+def extract_differential_diagnoses(text_lower, disease_name_lower):
     """
-    Extract differential diagnoses mentioned in Merck text.
+    Extract differential diagnoses mentioned in lowercased Merck text.
     Returns a list of disease names that should be differentiated.
     """
-    text_lower = merck_text.lower()
     differentials = set()
 
-    # Pattern 1: "must be differentiated from X"
-    for m in re.finditer(r'differentiat\w+ from (.+?)(?:\.|$)', text_lower):
-        items = re.split(r',\s*(?:and\s+)?|;\s*', m.group(1))
-        for item in items:
-            item = item.strip()
-            if 3 < len(item) < 60:
-                differentials.add(item)
-
-    # Pattern 2: "differential diagnosis includes X"
-    for m in re.finditer(r'differential diagnos\w+ (?:include|are|is)\s+(.+?)(?:\.|$)', text_lower):
-        items = re.split(r',\s*(?:and\s+)?|;\s*', m.group(1))
-        for item in items:
-            item = item.strip()
-            if 3 < len(item) < 60:
-                differentials.add(item)
-
-    # Pattern 3: "should be considered: X, Y, Z"
-    for m in re.finditer(r'should be (?:considered|ruled out)[:\s]+(.+?)(?:\.|$)', text_lower):
-        items = re.split(r',\s*(?:and\s+)?|;\s*', m.group(1))
+    # One pass over the text for all three phrasings
+    for m in DIFFERENTIALS_PATTERN.finditer(text_lower):
+        items = LIST_SPLIT_PATTERN.split(m.group("a") or m.group("b") or m.group("c"))
         for item in items:
             item = item.strip()
             if 3 < len(item) < 60:
                 differentials.add(item)
 
     # Remove the disease itself from differentials
-    differentials = {d for d in differentials if disease_name.lower() not in d}
+    differentials = {d for d in differentials if disease_name_lower not in d}
 
     return sorted(differentials)
 
-def extract_key_clinical_features(merck_text):
-    """Extract key clinical features/keywords from Merck text."""
+def extract_key_clinical_features(text_lower):
+    """Extract key clinical features/keywords from lowercased Merck text."""
     features = set()
 
     # Look for clinical signs patterns
-    for m in re.finditer(r'clinical (?:signs?|features?|findings?) (?:include|are|may include)\s+(.+?)(?:\.|$)', merck_text.lower()):
-        items = re.split(r',\s*(?:and\s+)?|;\s*', m.group(1))
+    for m in CLINICAL_SIGNS_PATTERN.finditer(text_lower):
+        items = LIST_SPLIT_PATTERN.split(m.group(1))
         for item in items:
             item = item.strip()
             if 3 < len(item) < 60:
@@ -69,83 +79,139 @@ def extract_key_clinical_features(merck_text):
 
     return sorted(features)
 
-def extract_prognosis_info(merck_text):
-    """Extract prognosis information from Merck text."""
+def extract_prognosis_info(text_lower):
+    """Extract prognosis information from lowercased Merck text."""
     prognosis_sentences = []
 
-    for m in re.finditer(r'[^.]*(?:prognosis|mortality|survival|fatal)[^.]*\.', merck_text.lower()):
+    for m in PROGNOSIS_SENTENCE_PATTERN.finditer(text_lower):
         sentence = m.group(0).strip()
         if 10 < len(sentence) < 200:
             prognosis_sentences.append(sentence)
 
     return prognosis_sentences[:3]
 
-def enrich_yaml(slug, yaml_content, merck_data):
+def enrich_yaml(slug, yaml_data, merck_data, merck_text):
     """
-    Enrich a YAML file with Merck-derived information.
-    Modifies the YAML content string and returns the updated version.
+    Enrich a disease's round-trip YAML data with Merck-derived information.
+    merck_text is the disease's matched section texts joined together.
+    Updates yaml_data in place and returns the list of changes made.
     """
-    yaml_data = yaml.safe_load(yaml_content)
-    merck_text = "\n".join(m["text"] for m in merck_data["matches"])
+    # The extractors all work on lowercased text; lower it once here
+    merck_text_lower = merck_text.lower()
+    name_lower = merck_data["nameEn"].lower()
 
     changes = []
 
     # 1. Extract differential diagnoses
-    diffs = extract_differential_diagnoses(merck_text, merck_data["nameEn"])
+    diffs = extract_differential_diagnoses(merck_text_lower, name_lower)
     if diffs and len(diffs) >= 2:
-        # Add to diagnosis.differentialDiagnoses in the YAML
-        diff_yaml = "\n  differentialDiagnoses:\n"
-        for d in diffs[:8]:  # Max 8 differentials
-            # Capitalize each word for proper display
-            d_title = d.title()
-            diff_yaml += f"    - {d_title}\n"
-
-        # Insert before merckManualRef (or at end of diagnosis section)
-        if "merckManualRef:" in yaml_content:
-            yaml_content = yaml_content.replace(
-                "\nmerckManualRef:",
-                diff_yaml + "\nmerckManualRef:"
-            )
+        # Add to diagnosis.differentialDiagnoses, keeping any hand-curated list
+        diagnosis = yaml_data.setdefault("diagnosis", CommentedMap())
+        if "differentialDiagnoses" not in diagnosis:
+            # Max 8 differentials, each word capitalized for proper display
+            diagnosis["differentialDiagnoses"] = [d.title() for d in diffs[:8]]
             changes.append(f"Added {len(diffs[:8])} differential diagnoses")
 
     # 2. Check if prognosis is missing and Merck has it
     if not yaml_data.get("prognosis"):
-        prognosis_info = extract_prognosis_info(merck_text)
+        prognosis_info = extract_prognosis_info(merck_text_lower)
         if prognosis_info:
             # Don't copy Merck text directly - just note that prognosis info exists
             # This is handled by the merckManualRef for users to look up
             pass
 
-    return yaml_content, changes
+    return changes
+
+def dump_yaml(yaml_data):
+    """Dump round-trip YAML data to a string."""
+    buf = io.StringIO()
+    yaml.dump(yaml_data, buf)
+    return buf.getvalue()
+
+def only_inserts(original, updated):
+    """Whether updated is original with one block of text inserted and nothing else changed."""
+    prefix = len(os.path.commonprefix([original, updated]))
+    return len(updated) >= len(original) and updated.endswith(original[prefix:])
+
+def _process_one(slug, merck_data, merck_text):
+    """
+    Worker: enrich one disease file in memory.
+    Returns (updated YAML text or None, list of changes, round_trips), where
+    round_trips is False if dumping the edit would also reformat other parts
+    of the file; such files are left alone.
+    """
+    yaml_file = DISEASES_DIR / f"{slug}.yaml"
+    original = yaml_file.read_text(encoding="utf-8")
+    yaml_data = yaml.load(original)
+    changes = enrich_yaml(slug, yaml_data, merck_data, merck_text)
+    if not changes:
+        return None, changes, True
+
+    # The edit only adds keys, so a file that round-trips cleanly dumps as the
+    # original text plus the new block; this needs no separate unedited dump
+    updated = dump_yaml(yaml_data)
+    if not only_inserts(original, updated):
+        return None, [], False
+    return updated, changes, True
 
 def main():
-    with open(MATCH_FILE, "r", encoding="utf-8") as f:
-        matches = json.load(f)
+    content = orjson.loads(MATCH_FILE.read_bytes())
+    sections = content["sections"]
+    matches = content["diseases"]
 
-    total_enriched = 0
-    total_diffs_added = 0
+    diseases = load_all_diseases(DISEASES_DIR)
 
+    candidates = []
     for slug, merck_data in matches.items():
         if merck_data["bestScore"] < 0.85:
             continue  # Only enrich high-quality matches
 
-        yaml_file = DISEASES_DIR / f"{slug}.yaml"
-        if not yaml_file.exists():
+        # Only files already linked by add-merck-refs are enriched; the cached
+        # index answers that without a round-trip parse
+        cached = diseases.get(slug)
+        if cached is None or "merckManualRef" not in cached:
+            continue
+        # enrich_yaml keeps an existing differentials list, so these files
+        # would only be parsed to change nothing
+        diagnosis = cached.get("diagnosis")
+        if isinstance(diagnosis, dict) and "differentialDiagnoses" in diagnosis:
             continue
 
-        with open(yaml_file, "r", encoding="utf-8") as f:
-            yaml_content = f.read()
-
-        updated_content, changes = enrich_yaml(slug, yaml_content, merck_data)
+        candidates.append(slug)
 
-        if changes:
-            with open(yaml_file, "w", encoding="utf-8") as f:
-                f.write(updated_content)
-            total_enriched += 1
-            total_diffs_added += sum(1 for c in changes if "differential" in c)
+    updates = []
+    not_round_trippable = []
+    total_diffs_added = 0
 
-    print(f"Enriched: {total_enriched} files")
+    # Parsing, extraction and dumping are CPU-bound and independent per disease
+    with ProcessPoolExecutor() as executor:
+        merck_texts = [
+            "\n".join(sections[m["section_id"]]["text"] for m in matches[slug]["matches"])
+            for slug in candidates
+        ]
+        results = executor.map(
+            _process_one, candidates, [matches[slug] for slug in candidates], merck_texts,
+            chunksize=32,
+        )
+        for slug, (content, changes, round_trips) in zip(candidates, results):
+            if not round_trips:
+                not_round_trippable.append(slug)
+            elif changes:
+                updates.append((DISEASES_DIR / f"{slug}.yaml", content))
+                total_diffs_added += sum(1 for c in changes if "differential" in c)
+
+    # Write all enriched files in one pass, each via a temp file + rename
+    for yaml_file, content in updates:
+        tmp_file = yaml_file.with_suffix(".yaml.tmp")
+        tmp_file.write_text(content, encoding="utf-8")
+        os.replace(tmp_file, yaml_file)
+
+    print(f"Enriched: {len(updates)} files")
     print(f"Differential diagnoses added: {total_diffs_added} files")
+    if not_round_trippable:
+        print(f"Skipped (would be reformatted by a load/dump): {len(not_round_trippable)} files")
+        for slug in not_round_trippable:
+            print(f"  {slug}")
 
 if __name__ == "__main__":
     main()
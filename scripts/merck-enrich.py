@@ -7,21 +7,30 @@ and produces a JSON mapping of disease → relevant Merck excerpts for enrichmen
 
 import os
 import re
-import json
-import yaml
+import bisect
+import orjson
 from pathlib import Path
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None  # Fall back to a str.find scan per term
+
+from _yaml_cache import load_all_diseases
+
 MERCK_DIR = Path("C:/project/merck-text")
 DISEASES_DIR = Path("C:/project/vetpro/data/diseases")
 OUTPUT_FILE = Path("C:/project/vetpro/scripts/merck-matches.json")
 
+# "--- PAGE 123 ---" markers written by the text extraction step
+PAGE_MARKER_PATTERN = re.compile(r"--- PAGE (\d+) ---")
+PAGE_HEADER_PATTERN = re.compile(r"(\d+) ---\n(.*)", re.DOTALL)
+WORD_PATTERN = re.compile(r"[a-z]+")
+
 def load_diseases():
     """Load all disease YAML files and extract searchable terms."""
     diseases = []
-    for f in sorted(DISEASES_DIR.glob("*.yaml")):
-        with open(f, "r", encoding="utf-8") as fh:
-            data = yaml.safe_load(fh)
-
+    for stem, data in load_all_diseases(DISEASES_DIR).items():
         # Collect all searchable English terms for this disease
         search_terms = set()
 
@@ -31,7 +40,7 @@ def load_diseases():
             search_terms.add(name_en.lower())
 
         # Slug as fallback
-        slug = data.get("slug", f.stem)
+        slug = data.get("slug", stem)
         search_terms.add(slug.replace("-", " "))
 
         # Aliases (English only)
@@ -46,18 +55,22 @@ def load_diseases():
             "nameEn": name_en,
             "nameZh": data.get("nameZh", ""),
             "bodySystem": data.get("bodySystem", ""),
-            "file": str(f),
+            "file": str(DISEASES_DIR / f"{stem}.yaml"),
             "searchTerms": list(search_terms),
         })
 
     return diseases
 
 def load_merck_chapters():
-    """Load all extracted Merck chapter text files."""
+    """
+    Load all extracted Merck chapter text files.
+    Returns {chapter code: (text, lowercased text)} so each chapter is lowercased once.
+    """
     chapters = {}
     for f in sorted(MERCK_DIR.glob("*.txt")):
         with open(f, "r", encoding="utf-8") as fh:
-            chapters[f.stem] = fh.read()
+            text = fh.read()
+        chapters[f.stem] = (text, text.lower())
     return chapters
 
 def find_merck_sections(text):
@@ -72,7 +85,7 @@ def find_merck_sections(text):
         if not page.strip():
             continue
         # Extract page number
-        match = re.match(r"(\d+) ---\n(.*)", page, re.DOTALL)
+        match = PAGE_HEADER_PATTERN.match(page)
         if not match:
             continue
         page_num = int(match.group(1))
@@ -104,38 +117,94 @@ def find_merck_sections(text):
 
     return sections
 
-def search_disease_in_chapters(disease, chapters):
-    """Search for a disease across all Merck chapters."""
+def build_term_automaton(terms):
+    """Build one Aho-Corasick automaton over all disease search terms."""
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+def find_term_hits(automaton, chapter_lower):
+    """
+    Scan a chapter once for all search terms.
+    Returns {term: [start offsets]} holding the first 3 non-overlapping hits of each term.
+    """
+    hits = {}
+    for end_idx, term in automaton.iter(chapter_lower):
+        start = end_idx - len(term) + 1
+        found = hits.setdefault(term, [])
+        # Max 3 matches per term per chapter, skipping overlaps like re.finditer
+        if len(found) < 3 and (not found or start >= found[-1] + len(term)):
+            found.append(start)
+    return hits
+
+def inner_words(term):
+    """
+    Words of a term with a non-letter on both sides inside the term.
+    Any text containing the term must contain each of these as a whole word.
+    """
+    return [
+        m.group(0) for m in WORD_PATTERN.finditer(term)
+        if m.start() > 0 and m.end() < len(term)
+    ]
+
+def find_term_hits_literal(term_words, chapter_lower):
+    """
+    Same result as find_term_hits, using str.find per term when pyahocorasick is missing.
+    term_words maps each term to its inner_words(); terms whose inner words are not
+    all in the chapter are skipped without scanning it.
+    """
+    chapter_words = set(WORD_PATTERN.findall(chapter_lower))
+    hits = {}
+    for term, words in term_words.items():
+        if not chapter_words.issuperset(words):
+            continue
+        found = []
+        idx = chapter_lower.find(term)
+        while idx >= 0 and len(found) < 3:
+            found.append(idx)
+            idx = chapter_lower.find(term, idx + len(term))
+        if found:
+            hits[term] = found
+    return hits
+
+def build_page_index(chapter_text):
+    """Return (marker end offsets, page numbers) for the page markers in a chapter."""
+    offsets, pages = [], []
+    for m in PAGE_MARKER_PATTERN.finditer(chapter_text):
+        offsets.append(m.end())
+        pages.append(int(m.group(1)))
+    return offsets, pages
+
+def page_at(page_index, pos):
+    """Page number of the last marker that ends at or before pos (0 if none)."""
+    offsets, pages = page_index
+    i = bisect.bisect_right(offsets, pos) - 1
+    return pages[i] if i >= 0 else 0
+
+def search_disease_in_chapters(disease, chapters, chapter_hits, page_indexes):
+    """Collect a disease's matches from the pre-scanned Merck chapters."""
     matches = []
 
-    for chapter_code, chapter_text in chapters.items():
-        chapter_lower = chapter_text.lower()
+    for chapter_code, (chapter_text, _) in chapters.items():
+        term_hits = chapter_hits[chapter_code]
 
         for term in disease["searchTerms"]:
-            if len(term) < 4:  # Skip very short terms to avoid false positives
-                continue
-
-            # Use word boundary matching for longer terms
-            pattern = re.escape(term)
-            found = list(re.finditer(pattern, chapter_lower))
+            # Extract context around each match (500 chars before and after)
+            for pos in term_hits.get(term, ()):
+                start = max(0, pos - 300)
+                end = min(len(chapter_text), pos + len(term) + 500)
+                context = chapter_text[start:end].strip()
 
-            if found:
-                # Extract context around each match (500 chars before and after)
-                for m in found[:3]:  # Max 3 matches per term per chapter
-                    start = max(0, m.start() - 300)
-                    end = min(len(chapter_text), m.end() + 500)
-                    context = chapter_text[start:end].strip()
+                page = page_at(page_indexes[chapter_code], pos)
 
-                    # Find page number
-                    page_match = re.findall(r"--- PAGE (\d+) ---", chapter_text[:m.start()])
-                    page = int(page_match[-1]) if page_match else 0
-
-                    matches.append({
-                        "chapter": chapter_code,
-                        "term": term,
-                        "page": page,
-                        "context": context,
-                    })
+                matches.append({
+                    "chapter": chapter_code,
+                    "term": term,
+                    "page": page,
+                    "context": context,
+                })
 
     # Deduplicate by page
     seen_pages = set()
@@ -157,12 +226,31 @@ def main():
     chapters = load_merck_chapters()
     print(f"  Found {len(chapters)} chapters")
 
+    print("Scanning chapters for disease terms...")
+    search_terms = {
+        term for disease in diseases for term in disease["searchTerms"]
+        if len(term) >= 4  # Skip very short terms to avoid false positives
+    }
+    if ahocorasick is not None:
+        automaton = build_term_automaton(search_terms)
+        chapter_hits = {
+            code: find_term_hits(automaton, text_lower)
+            for code, (_, text_lower) in chapters.items()
+        }
+    else:
+        term_words = {term: inner_words(term) for term in search_terms}
+        chapter_hits = {
+            code: find_term_hits_literal(term_words, text_lower)
+            for code, (_, text_lower) in chapters.items()
+        }
+    page_indexes = {code: build_page_index(text) for code, (text, _) in chapters.items()}
+
     print("Matching diseases to Merck content...")
     results = {}
     matched_count = 0
 
     for i, disease in enumerate(diseases):
-        matches = search_disease_in_chapters(disease, chapters)
+        matches = search_disease_in_chapters(disease, chapters, chapter_hits, page_indexes)
         if matches:
             matched_count += 1
             results[disease["slug"]] = {
@@ -181,8 +269,7 @@ def main():
     print(f"\nResults: {matched_count}/{len(diseases)} diseases found in Merck Manual")
 
     # Save results
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    OUTPUT_FILE.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
     print(f"Saved to {OUTPUT_FILE}")
 
     # Print summary by chapter
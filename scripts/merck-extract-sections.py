@@ -10,33 +10,105 @@ Extracts disease-specific sections from the Merck Manual by:
 import re
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfReader
 from pathlib import Path
 
 PDF_PATH = "C:/project/The-Merck-Veterinary-Manual-11th-Edition.pdf"
 OUTPUT_DIR = Path("C:/project/merck-sections")
 INDEX_FILE = Path("C:/project/merck-sections/index.json")
+PAGES_CACHE = Path("C:/project/merck-sections/pages")
+PAGES_META = PAGES_CACHE / "pages_meta.json"
+PAGES_PER_TASK = 16  # PDF pages extracted per worker task
 
-def extract_all_text(reader, start_page, end_page):
-    """Extract text from a range of PDF pages."""
+# Per-worker PDF state, set up by _init_worker
+_PDF_PATH = None
+_READER = None
+
+# Lines that are never headers: "---" rules and lines starting with a number
+HEADER_NEG_PATTERN = re.compile(r'(?:---|\d+\s)')
+CAPS_RUN_PATTERN = re.compile(r'[A-Z]{3,}')
+TITLE_START_PATTERN = re.compile(r'^[A-Z][a-z]')
+
+def load_page_cache(pdf_path):
+    """
+    Check the per-page text cache against the PDF's mtime.
+    Returns the PDF page count; a changed PDF clears the cached pages.
+    """
+    pdf_mtime = os.stat(pdf_path).st_mtime
+    if PAGES_META.exists():
+        with open(PAGES_META, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("pdf_mtime") == pdf_mtime:
+            return meta["total_pages"]
+
+    total_pages = len(PdfReader(pdf_path).pages)
+    os.makedirs(PAGES_CACHE, exist_ok=True)
+    for cached in PAGES_CACHE.glob("*.txt"):
+        cached.unlink()
+    with open(PAGES_META, "w", encoding="utf-8") as f:
+        json.dump({"pdf_mtime": pdf_mtime, "total_pages": total_pages}, f)
+    return total_pages
+
+def _init_worker(pdf_path):
+    """Pool initializer: remember the PDF each worker reads from."""
+    global _PDF_PATH, _READER
+    _PDF_PATH = pdf_path
+    _READER = None
+
+def _get_reader():
+    """
+    Return this worker's PdfReader, opening it on first use.
+    Parsing the xref table is then paid once per worker rather than once per
+    task, and not at all when every page is already cached.
+    """
+    global _READER
+    if _READER is None:
+        _READER = PdfReader(_PDF_PATH, strict=False)
+    return _READER
+
+def extract_all_text(start_page, end_page):
+    """Extract text from a range of PDF pages, reusing cached page text."""
     text_parts = []
-    for i in range(start_page, min(end_page, len(reader.pages))):
-        page_text = reader.pages[i].extract_text()
+    for i in range(start_page, end_page):
+        cache_file = PAGES_CACHE / f"{i:05d}.txt"
+        if cache_file.exists():
+            page_text = cache_file.read_text(encoding="utf-8")
+        else:
+            page_text = _get_reader().pages[i].extract_text() or ""
+            # Write-then-rename so an interrupted run never leaves a partial page
+            tmp_file = cache_file.with_suffix(".tmp")
+            tmp_file.write_text(page_text, encoding="utf-8")
+            os.replace(tmp_file, cache_file)
         if page_text:
             text_parts.append((i + 1, page_text))  # 1-indexed PDF page
     return text_parts
 
+def iter_pages(executor, start_page, end_page):
+    """
+    Yield (pdf_page, text) for a range of PDF pages, in page order.
+    Pages are extracted across worker processes in PAGES_PER_TASK chunks and
+    handed on as each chunk arrives, so a chapter's raw text is never held
+    in one list.
+    """
+    starts = range(start_page, end_page, PAGES_PER_TASK)
+    ends = [min(s + PAGES_PER_TASK, end_page) for s in starts]
+    # map() yields results in submission order, so pages stay in sequence
+    for part in executor.map(extract_all_text, starts, ends):
+        yield from part
+
 def find_section_headers(page_texts):
     """
     Find disease section headers in Merck Manual text.
     Headers are typically ALL CAPS or Title Case lines at the start of sections.
+    page_texts may be any iterable of (pdf_page, text), e.g. iter_pages().
     """
     sections = []
     current_section = None
+    current_lines = []
 
     for pdf_page, text in page_texts:
-        lines = text.split("\n")
-        for line in lines:
+        for line in text.split("\n"):
             stripped = line.strip()
             if not stripped or len(stripped) < 3:
                 continue
@@ -46,19 +118,18 @@ def find_section_headers(page_texts):
             is_header = False
 
             # Pattern 1: ALL CAPS header (e.g., "HEARTWORM DISEASE")
-            if (stripped.isupper() and
-                5 < len(stripped) < 80 and
-                not stripped.startswith("---") and
-                not re.match(r'^\d+\s', stripped) and
-                re.search(r'[A-Z]{3,}', stripped)):
+            if (5 < len(stripped) < 80 and
+                stripped.isupper() and
+                not HEADER_NEG_PATTERN.match(stripped) and
+                CAPS_RUN_PATTERN.search(stripped)):
                 is_header = True
 
             # Pattern 2: Title with parenthetical synonym
             # e.g., "Dilated Cardiomyopathy (DCM)"
+            # (a line matching TITLE_START_PATTERN cannot start with "---")
             if (not is_header and
-                re.match(r'^[A-Z][a-z]', stripped) and
                 10 < len(stripped) < 100 and
-                not stripped.startswith("---")):
+                TITLE_START_PATTERN.match(stripped)):
                 # Check if it looks like a subsection header
                 words = stripped.split()
                 if len(words) >= 2 and len(words) <= 10:
@@ -68,24 +139,28 @@ def find_section_headers(page_texts):
 
             if is_header:
                 if current_section:
+                    current_section["text"] = "".join(current_lines)
                     sections.append(current_section)
                 current_section = {
                     "title": stripped,
                     "pdf_page": pdf_page,
                     "text": ""
                 }
+                current_lines = []
             elif current_section:
-                current_section["text"] += stripped + "\n"
+                # Joined once when the section closes; += on the dict value
+                # would copy the whole section text for every line
+                current_lines.append(stripped + "\n")
 
     if current_section:
+        current_section["text"] = "".join(current_lines)
         sections.append(current_section)
 
     return sections
 
 def main():
     print("Loading PDF...")
-    reader = PdfReader(PDF_PATH)
-    total_pages = len(reader.pages)
+    total_pages = load_page_cache(PDF_PATH)
     print(f"  Total pages: {total_pages}")
 
     # Chapter definitions (PDF page 0-indexed start, end)
@@ -113,42 +188,46 @@ def main():
 
     all_sections = {}
 
-    for code, (name, start, end) in chapters.items():
-        print(f"\nProcessing {code}: {name} (PDF pages {start+1}-{end})...")
-        page_texts = extract_all_text(reader, start, end)
-        sections = find_section_headers(page_texts)
-
-        # Save sections for this chapter
-        chapter_sections = []
-        for s in sections:
-            chapter_sections.append({
-                "title": s["title"],
-                "pdf_page": s["pdf_page"],
-                "text_length": len(s["text"]),
-                "text_preview": s["text"][:200]
-            })
-
-        all_sections[code] = {
-            "name": name,
-            "section_count": len(sections),
-            "sections": chapter_sections
-        }
-
-        # Save full text for each chapter's sections
-        chapter_file = OUTPUT_DIR / f"{code}-sections.json"
-        full_sections = []
-        for s in sections:
-            if len(s["text"]) > 100:  # Skip very short sections
-                full_sections.append({
+    with ProcessPoolExecutor(
+        max_workers=os.cpu_count(), initializer=_init_worker, initargs=(PDF_PATH,)
+    ) as executor:
+        for code, (name, start, end) in chapters.items():
+            print(f"\nProcessing {code}: {name} (PDF pages {start+1}-{end})...")
+            sections = find_section_headers(
+                iter_pages(executor, start, min(end, total_pages))
+            )
+
+            # Save sections for this chapter
+            chapter_sections = []
+            for s in sections:
+                chapter_sections.append({
                     "title": s["title"],
                     "pdf_page": s["pdf_page"],
-                    "text": s["text"]
+                    "text_length": len(s["text"]),
+                    "text_preview": s["text"][:200]
                 })
 
-        with open(chapter_file, "w", encoding="utf-8") as f:
-            json.dump(full_sections, f, ensure_ascii=False, indent=2)
-
-        print(f"  Found {len(sections)} sections ({len(full_sections)} with content)")
+            all_sections[code] = {
+                "name": name,
+                "section_count": len(sections),
+                "sections": chapter_sections
+            }
+
+            # Save full text for each chapter's sections
+            chapter_file = OUTPUT_DIR / f"{code}-sections.json"
+            full_sections = []
+            for s in sections:
+                if len(s["text"]) > 100:  # Skip very short sections
+                    full_sections.append({
+                        "title": s["title"],
+                        "pdf_page": s["pdf_page"],
+                        "text": s["text"]
+                    })
+
+            with open(chapter_file, "w", encoding="utf-8") as f:
+                json.dump(full_sections, f, ensure_ascii=False, indent=2)
+
+            print(f"  Found {len(sections)} sections ({len(full_sections)} with content)")
 
     # Save index
     with open(INDEX_FILE, "w", encoding="utf-8") as f:
@@ -4,11 +4,13 @@ For each disease, identify what Merck mentions that the YAML doesn't cover.
 Focus on: prognosis, differential diagnosis, epidemiology, key drug doses.
 """
 
-import json
+import orjson
 import re
-import yaml
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from _yaml_cache import load_all_diseases
+
 MATCH_FILE = Path("C:/project/vetpro/scripts/merck-disease-content.json")
 DISEASES_DIR = Path("C:/project/vetpro/data/diseases")
 OUTPUT_FILE = Path("C:/project/vetpro/scripts/merck-gaps.json")
@@ -31,9 +33,11 @@ TREATMENT_DRUG_PATTERN = re.compile(
     re.IGNORECASE
 )
 
-def extract_info_from_merck(merck_text):
-    """Extract structured info categories from Merck text."""
-    text_lower = merck_text.lower()
+def extract_info_from_merck(merck_text, text_lower):
+    """
+    Extract structured info categories from Merck text.
+    text_lower is merck_text.lower(), computed once by the caller.
+    """
     info = {
         "has_prognosis": any(kw in text_lower for kw in PROGNOSIS_KEYWORDS),
         "has_diff_dx": any(kw in text_lower for kw in DIFF_DX_KEYWORDS),
@@ -59,54 +63,74 @@ def check_yaml_completeness(yaml_data):
         "description_length": len(yaml_data.get("description", "")),
     }
 
+def _process_one(match_data, yaml_status, merck_text):
+    """
+    Worker: compare one disease's YAML status against its combined Merck text.
+    Returns the disease's gap entry, or None if there are no gaps.
+    """
+    merck_text_lower = merck_text.lower()
+
+    merck_info = extract_info_from_merck(merck_text, merck_text_lower)
+
+    # Identify gaps: Merck has info that YAML doesn't
+    gap_items = []
+    if merck_info["has_prognosis"] and not yaml_status["has_prognosis"]:
+        gap_items.append("prognosis")
+    if merck_info["has_diff_dx"] and not yaml_status["has_diff_dx"]:
+        gap_items.append("differentialDiagnoses")
+    if merck_info["drug_doses"] and not yaml_status["has_treatment"]:
+        gap_items.append("treatment_doses")
+    if merck_info["has_epidemiology"] and not yaml_status["has_epidemiology"]:
+        gap_items.append("epidemiology")
+
+    if not gap_items:
+        return None
+
+    return {
+        "nameEn": match_data["nameEn"],
+        "gaps": gap_items,
+        "merck_text_length": merck_info["text_length"],
+        "drug_doses_found": merck_info["drug_doses"][:5],
+        "yaml_description_length": yaml_status["description_length"],
+        "bestScore": match_data["bestScore"],
+    }
+
 def main():
-    with open(MATCH_FILE, "r", encoding="utf-8") as f:
-        matches = json.load(f)
+    content = orjson.loads(MATCH_FILE.read_bytes())
+    sections = content["sections"]
+    matches = content["diseases"]
+
+    diseases = load_all_diseases(DISEASES_DIR)
+
+    # Only the small status dict goes to the workers, not the parsed YAML
+    slugs = [slug for slug in matches if slug in diseases]
+    yaml_statuses = [check_yaml_completeness(diseases[slug]) for slug in slugs]
+
+    # Combine all Merck text for each disease
+    merck_texts = [
+        "\n".join(sections[m["section_id"]]["text"] for m in matches[slug]["matches"])
+        for slug in slugs
+    ]
 
     gaps = {}
     enrichment_candidates = []
 
-    for slug, match_data in matches.items():
-        yaml_file = DISEASES_DIR / f"{slug}.yaml"
-        if not yaml_file.exists():
-            continue
-
-        with open(yaml_file, "r", encoding="utf-8") as f:
-            yaml_data = yaml.safe_load(f.read())
-
-        # Combine all Merck text for this disease
-        merck_text = "\n".join(m["text"] for m in match_data["matches"])
-
-        yaml_status = check_yaml_completeness(yaml_data)
-        merck_info = extract_info_from_merck(merck_text)
-
-        # Identify gaps: Merck has info that YAML doesn't
-        gap_items = []
-        if merck_info["has_prognosis"] and not yaml_status["has_prognosis"]:
-            gap_items.append("prognosis")
-        if merck_info["has_diff_dx"] and not yaml_status["has_diff_dx"]:
-            gap_items.append("differentialDiagnoses")
-        if merck_info["drug_doses"] and not yaml_status["has_treatment"]:
-            gap_items.append("treatment_doses")
-        if merck_info["has_epidemiology"] and not yaml_status["has_epidemiology"]:
-            gap_items.append("epidemiology")
-
-        if gap_items:
-            gaps[slug] = {
-                "nameEn": match_data["nameEn"],
-                "gaps": gap_items,
-                "merck_text_length": merck_info["text_length"],
-                "drug_doses_found": merck_info["drug_doses"][:5],
-                "yaml_description_length": yaml_status["description_length"],
-                "bestScore": match_data["bestScore"],
-            }
+    # Each disease is independent; map() keeps results in match-file order
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(
+            _process_one, [matches[slug] for slug in slugs], yaml_statuses, merck_texts,
+            chunksize=32,
+        )
+        for slug, gap in zip(slugs, results):
+            if gap is None:
+                continue
+            gaps[slug] = gap
 
             # High-value enrichment candidates: high-quality match + multiple gaps
-            if match_data["bestScore"] >= 0.85 and len(gap_items) >= 2:
+            if gap["bestScore"] >= 0.85 and len(gap["gaps"]) >= 2:
                 enrichment_candidates.append(slug)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(gaps, f, ensure_ascii=False, indent=2)
+    OUTPUT_FILE.write_bytes(orjson.dumps(gaps, option=orjson.OPT_INDENT_2))
 
     with open("scripts/enrichment-candidates.txt", "w", encoding="utf-8") as f:
         f.write(f"Total gaps found: {len(gaps)}\n")
@@ -3,35 +3,62 @@ Match Merck sections to VetPro diseases and extract enrichment content.
 Produces a JSON file mapping each disease to its best Merck section(s).
 """
 
-import json
+import heapq
+import mmap
+import numpy as np
+import orjson
 import re
-import yaml
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None  # Fall back to one substring test per term
+
+from _yaml_cache import load_all_diseases
 
 SECTIONS_DIR = Path("C:/project/merck-sections")
 DISEASES_DIR = Path("C:/project/vetpro/data/diseases")
 OUTPUT_FILE = Path("C:/project/vetpro/scripts/merck-disease-content.json")
+FUZZY_CUTOFF = 80  # Title WRatio (0-100) below this never scores
+TEXT_HEAD_CHARS = 500  # A term in this much of the text counts as prominent
+LOAD_THREADS = 32  # Section files are read concurrently
+
+NON_ALNUM_PATTERN = re.compile(r'[^a-z0-9\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# The parts of the sections dict that _match_one reads; only these are sent to
+# the workers (initargs are pickled once per worker under spawn)
+WORKER_SECTION_KEYS = (
+    "titles_normalized", "text_lengths",
+    "sections_by_title_term", "sections_by_head_term", "sections_by_title",
+)
 
+# Per-worker section data, set up by _init_worker
+_SECTIONS = None
+_TITLE_INDEX = None
+
+@lru_cache(maxsize=None)
 def normalize(s):
-    """Normalize a string for matching."""
+    """Normalize a string for matching (memoized; titles and aliases repeat)."""
     s = s.lower().strip()
-    s = re.sub(r'[^a-z0-9\s]', '', s)
-    s = re.sub(r'\s+', ' ', s)
+    s = NON_ALNUM_PATTERN.sub('', s)
+    s = WHITESPACE_PATTERN.sub(' ', s)
     return s
 
 def load_diseases():
     """Load all diseases with search terms."""
     diseases = []
-    for f in sorted(DISEASES_DIR.glob("*.yaml")):
-        with open(f, "r", encoding="utf-8") as fh:
-            data = yaml.safe_load(fh)
-
+    for stem, data in load_all_diseases(DISEASES_DIR).items():
         terms = set()
         name_en = data.get("nameEn", "")
         if name_en:
             terms.add(normalize(name_en))
-        slug = data.get("slug", f.stem)
+        slug = data.get("slug", stem)
         terms.add(normalize(slug.replace("-", " ")))
 
         for alias in data.get("aliases", []):
@@ -44,70 +71,215 @@ def load_diseases():
             "slug": slug,
             "nameEn": name_en,
             "bodySystem": data.get("bodySystem", ""),
-            "terms": [t for t in terms if len(t) > 3],
-            "file": str(f),
+            # Longest (most specific) terms first, so they hit exact and
+            # containment matches before shorter ones. Interned: the same
+            # terms recur across diseases and come back as matched_term
+            "terms": sorted(
+                (sys.intern(t) for t in terms if len(t) > 3), key=lambda t: (-len(t), t)
+            ),
+            "file": str(DISEASES_DIR / f"{stem}.yaml"),
         })
     return diseases
 
+def _load_json(path):
+    """Parse one JSON file straight from a memory map, without a bytes copy."""
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as buf:
+            return orjson.loads(buf)
+
 def load_all_sections():
-    """Load all extracted Merck sections."""
-    all_sections = []
-    for f in sorted(SECTIONS_DIR.glob("*-sections.json")):
-        chapter = f.stem.replace("-sections", "")
-        with open(f, "r", encoding="utf-8") as fh:
-            sections = json.load(fh)
-        for s in sections:
-            s["chapter"] = chapter
-            s["title_normalized"] = normalize(s["title"])
-            all_sections.append(s)
+    """
+    Load all extracted Merck sections.
+    Returns a dict of parallel lists, one entry per section; the matcher
+    walks them by index and only touches the fields it needs.
+    """
+    all_sections = {
+        "titles": [],
+        "titles_normalized": [],
+        "chapters": [],
+        "pdf_pages": [],
+        "texts": [],
+        "text_lengths": [],
+        "text_heads": [],
+    }
+
+    files = sorted(SECTIONS_DIR.glob("*-sections.json"))
+    with ThreadPoolExecutor(max_workers=LOAD_THREADS) as executor:
+        # Consumed as files finish parsing; each file's dicts are dropped
+        # once their fields are copied out
+        for f, sections in zip(files, executor.map(_load_json, files)):
+            chapter = sys.intern(f.stem.replace("-sections", ""))
+            for s in sections:
+                text = s.get("text", "")
+                all_sections["titles"].append(s["title"])
+                all_sections["titles_normalized"].append(normalize(s["title"]))
+                all_sections["chapters"].append(chapter)
+                all_sections["pdf_pages"].append(s.get("pdf_page", 0))
+                all_sections["texts"].append(text)
+                all_sections["text_lengths"].append(len(text))
+                # Slice before lowering so only the head is ever lowercased
+                all_sections["text_heads"].append(text[:TEXT_HEAD_CHARS].lower())
     return all_sections
 
-def match_disease_to_sections(disease, sections):
-    """Find the best matching Merck sections for a disease."""
-    matches = []
-
-    for section in sections:
-        section_title = section["title_normalized"]
-        section_text_lower = section.get("text", "").lower()
-        best_score = 0
-        best_term = ""
-
-        for term in disease["terms"]:
-            # Exact title match (highest priority)
-            if term == section_title:
-                score = 1.0
-            # Title contains term
-            elif term in section_title or section_title in term:
-                score = 0.9
-            # Fuzzy title match
-            else:
-                ratio = SequenceMatcher(None, term, section_title).ratio()
-                if ratio > 0.7:
-                    score = ratio * 0.85
-                # Term appears prominently in text (first 500 chars)
-                elif term in section_text_lower[:500]:
-                    score = 0.6
-                else:
-                    score = 0
-
-            if score > best_score:
-                best_score = score
-                best_term = term
-
-        if best_score >= 0.6:
-            matches.append({
-                "title": section["title"],
-                "chapter": section["chapter"],
-                "pdf_page": section.get("pdf_page", 0),
-                "score": round(best_score, 3),
-                "matched_term": best_term,
-                "text_length": len(section.get("text", "")),
-                "text": section.get("text", "")
-            })
-
-    # Sort by score (descending) then text length (prefer longer sections)
-    matches.sort(key=lambda x: (-x["score"], -x["text_length"]))
-    return matches[:5]  # Top 5 matches
+def build_title_index(section_titles):
+    """Index section titles by length for fuzzy_title_ratios()."""
+    lengths = np.array([len(t) for t in section_titles], dtype=np.int32)
+    order = np.argsort(lengths, kind="stable")
+    return {"titles": section_titles, "order": order, "lengths": lengths[order]}
+
+def length_band(term):
+    """
+    Range of title lengths that can reach FUZZY_CUTOFF against term.
+    fuzz.WRatio caps its score at 60 once one string is more than 8 times
+    longer than the other, so with a cutoff above 60 that bounds the length.
+    """
+    if FUZZY_CUTOFF <= 60:
+        return 0, float("inf")
+    return len(term) / 8, len(term) * 8
+
+def fuzzy_title_ratios(terms, title_index):
+    """
+    Score a disease's terms against every section title in one batch.
+    Returns a terms x sections uint8 array of title ratios (0-100, rounded
+    to whole points); ratios below FUZZY_CUTOFF come back as 0. Only titles
+    whose length falls in some term's length_band() are scored; the rest
+    cannot reach the cutoff.
+    """
+    titles = title_index["titles"]
+    order, lengths = title_index["order"], title_index["lengths"]
+
+    bands = []
+    for term in terms:
+        lo, hi = length_band(term)
+        start = np.searchsorted(lengths, lo, side="left")
+        end = np.searchsorted(lengths, hi, side="right")
+        bands.append(order[start:end])
+    candidates = np.unique(np.concatenate(bands)) if bands else order[:0]
+
+    # Single-threaded: the process pool already keeps every core busy
+    scores = process.cdist(
+        terms, [titles[j] for j in candidates], scorer=fuzz.WRatio,
+        score_cutoff=FUZZY_CUTOFF, dtype=np.uint8, workers=1,
+    )
+    ratios = np.zeros((len(terms), len(titles)), dtype=scores.dtype)
+    ratios[:, candidates] = scores
+    return ratios
+
+def build_term_automaton(terms):
+    """Build one Aho-Corasick automaton over a set of strings."""
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+def find_terms(automaton, terms, text):
+    """Return the set of terms that occur anywhere in text."""
+    if automaton is None:
+        return {term for term in terms if term in text}
+    return {term for _, term in automaton.iter(text)}
+
+def index_substring_hits(diseases, sections):
+    """
+    Precompute every substring relation the matcher needs.
+    Each section title and text head is scanned once for all disease terms,
+    and each term once for all section titles, instead of testing each pair
+    per disease. Adds to sections:
+      sections_by_title_term  term -> sections whose title contains it
+      sections_by_head_term   term -> sections whose text head contains it
+      sections_by_title       normalized title -> sections with that title
+    and to each disease "term_titles": per term, the titles it contains.
+    """
+    terms = {term for d in diseases for term in d["terms"]}
+    automaton = build_term_automaton(terms) if ahocorasick and terms else None
+
+    by_title_term = {}
+    by_head_term = {}
+    by_title = {}
+    for j, (title, text_head) in enumerate(zip(sections["titles_normalized"], sections["text_heads"])):
+        for term in find_terms(automaton, terms, title):
+            by_title_term.setdefault(term, []).append(j)
+        for term in find_terms(automaton, terms, text_head):
+            by_head_term.setdefault(term, []).append(j)
+        by_title.setdefault(title, []).append(j)
+    sections["sections_by_title_term"] = by_title_term
+    sections["sections_by_head_term"] = by_head_term
+    sections["sections_by_title"] = by_title
+
+    # Titles are the needles here; an empty title would match every term
+    titles = set(by_title) - {""}
+    automaton = build_term_automaton(titles) if ahocorasick and titles else None
+
+    term_titles = {term: find_terms(automaton, titles, term) for term in terms}
+    for d in diseases:
+        d["term_titles"] = [term_titles[term] for term in d["terms"]]
+
+def match_disease_to_sections(disease, sections, ratios):
+    """
+    Find the best matching Merck sections for a disease.
+    ratios[t, j] is the fuzzy ratio of the disease's t-th term against the
+    title of section j, as returned by fuzzy_title_ratios(); diseases and
+    sections must have been through index_substring_hits().
+    """
+    terms = disease["terms"]
+    if not terms:
+        return []
+    by_title_term = sections["sections_by_title_term"]
+    by_head_term = sections["sections_by_head_term"]
+    by_title = sections["sections_by_title"]
+
+    # scores[t, j]: what term t scores against section j. Later tiers
+    # overwrite earlier ones, so each entry ends at its highest tier.
+    # Fuzzy title match; zero unless the title reached FUZZY_CUTOFF
+    scores = ratios.astype(np.float64) / 100 * 0.85
+    for t, term in enumerate(terms):
+        row = scores[t]
+        # Term appears prominently in text (first 500 chars), if the title
+        # gave no fuzzy score
+        head = np.array(by_head_term.get(term, []), dtype=np.intp)
+        row[head[row[head] == 0]] = 0.6
+        # Title contains term, or term contains title
+        contained = by_title_term.get(term, []) + [
+            j for title in disease["term_titles"][t] for j in by_title[title]
+        ]
+        row[contained] = 0.9
+        # Exact title match (highest priority)
+        row[by_title.get(term, [])] = 1.0
+
+    # argmax picks the first term reaching the best score, as a term-by-term
+    # scan keeping strict improvements would
+    best_terms = scores.argmax(axis=0)
+    best_scores = scores.max(axis=0)
+    candidates = np.flatnonzero(best_scores >= 0.6)
+
+    if len(candidates) > 5:
+        # Partition out the 5th best score; keep everything that could round
+        # to it as well so ties on the rounded score are still ordered by
+        # text length below
+        fifth = -np.partition(-best_scores[candidates], 4)[4]
+        candidates = candidates[best_scores[candidates] >= fifth - 0.001]
+
+    matches = [{
+        "section_id": int(j),  # Index into sections; main() remaps it
+        "score": round(float(best_scores[j]), 3),
+        "matched_term": terms[best_terms[j]],
+    } for j in candidates]
+
+    # Top 5 by score (descending) then text length (prefer longer sections);
+    # nsmallest matches sorted()[:5], ties included, without a full sort
+    text_lengths = sections["text_lengths"]
+    return heapq.nsmallest(5, matches, key=lambda x: (-x["score"], -text_lengths[x["section_id"]]))
+
+def _init_worker(sections):
+    """Pool initializer: keep the indexed sections in each worker."""
+    global _SECTIONS, _TITLE_INDEX
+    _SECTIONS = sections
+    _TITLE_INDEX = build_title_index(sections["titles_normalized"])
+
+def _match_one(disease):
+    """Worker: score one disease against all sections."""
+    ratios = fuzzy_title_ratios(disease["terms"], _TITLE_INDEX)
+    return match_disease_to_sections(disease, _SECTIONS, ratios)
 
 def main():
     print("Loading diseases...")
@@ -116,35 +288,56 @@ def main():
 
     print("Loading Merck sections...")
     sections = load_all_sections()
-    print(f"  {len(sections)} sections loaded")
+    print(f"  {len(sections['titles'])} sections loaded")
 
     print("Matching diseases to Merck sections...")
+    index_substring_hits(diseases, sections)
     results = {}
+    # Each matched section's text is stored once in section_table and
+    # referenced from every disease that matched it
+    section_table = []
+    table_ids = {}  # sections index -> section_table index
     matched_count = 0
     high_quality_count = 0
 
-    for i, disease in enumerate(diseases):
-        matches = match_disease_to_sections(disease, sections)
-        if matches:
-            matched_count += 1
-            # Check if we have a high-quality match (score >= 0.85)
-            if matches[0]["score"] >= 0.85:
-                high_quality_count += 1
-
-            results[disease["slug"]] = {
-                "nameEn": disease["nameEn"],
-                "bodySystem": disease["bodySystem"],
-                "matchCount": len(matches),
-                "bestScore": matches[0]["score"],
-                "matches": matches,
-            }
-
-        if (i + 1) % 50 == 0:
-            print(f"  {i+1}/{len(diseases)} processed ({matched_count} matched, {high_quality_count} high-quality)")
-
-    # Save results
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    # Diseases are scored independently; map() keeps them in input order
+    worker_sections = {key: sections[key] for key in WORKER_SECTION_KEYS}
+    with ProcessPoolExecutor(initializer=_init_worker, initargs=(worker_sections,)) as executor:
+        all_matches = executor.map(_match_one, diseases, chunksize=32)
+        for i, (disease, matches) in enumerate(zip(diseases, all_matches)):
+            if matches:
+                matched_count += 1
+                # Check if we have a high-quality match (score >= 0.85)
+                if matches[0]["score"] >= 0.85:
+                    high_quality_count += 1
+
+                for m in matches:
+                    j = m["section_id"]
+                    if j not in table_ids:
+                        table_ids[j] = len(section_table)
+                        section_table.append({
+                            "title": sections["titles"][j],
+                            "chapter": sections["chapters"][j],
+                            "pdf_page": sections["pdf_pages"][j],
+                            "text_length": sections["text_lengths"][j],
+                            "text": sections["texts"][j],
+                        })
+                    m["section_id"] = table_ids[j]
+
+                results[disease["slug"]] = {
+                    "nameEn": disease["nameEn"],
+                    "bodySystem": disease["bodySystem"],
+                    "matchCount": len(matches),
+                    "bestScore": matches[0]["score"],
+                    "matches": matches,
+                }
+
+            if (i + 1) % 50 == 0:
+                print(f"  {i+1}/{len(diseases)} processed ({matched_count} matched, {high_quality_count} high-quality)")
+
+    # Save results; match entries point into "sections" by section_id
+    output = {"sections": section_table, "diseases": results}
+    OUTPUT_FILE.write_bytes(orjson.dumps(output, option=orjson.OPT_INDENT_2))
 
     print(f"\n=== Results ===")
     print(f"Total matched: {matched_count}/{len(diseases)}")
@@ -172,10 +365,12 @@ def main():
 
     # Show some high-quality examples
     print("\nTop 10 best matches:")
-    sorted_results = sorted(results.items(), key=lambda x: (-x[1]["bestScore"], -x[1]["matches"][0]["text_length"]))
+    best_section = lambda data: section_table[data["matches"][0]["section_id"]]
+    sorted_results = sorted(results.items(), key=lambda x: (-x[1]["bestScore"], -best_section(x[1])["text_length"]))
     for slug, data in sorted_results[:10]:
         m = data["matches"][0]
-        print(f"  {slug}: score={m['score']}, chapter={m['chapter']}, text={m['text_length']}chars, title='{m['title']}'")
+        sec = best_section(data)
+        print(f"  {slug}: score={m['score']}, chapter={sec['chapter']}, text={sec['text_length']}chars, title='{sec['title']}'")
 
 if __name__ == "__main__":
     main()